@@ -5,45 +5,179 @@ MongoDB helper functions ready to use in your backend code.
 Import and use these functions in your API endpoints for database operations.
 """
 
-from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError
+from bson import ObjectId
 from datetime import datetime, timezone
+import asyncio
+import logging
 import os
+import time
 from dotenv import load_dotenv
-from typing import Union
+from typing import Dict, List, Optional, Tuple, Union
 from pydantic import BaseModel
 
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 _client = None
 db = None
 
 database_url = os.getenv("DATABASE_URL")
 database_name = os.getenv("DATABASE_NAME")
 
-if database_url and database_name:
-    _client = MongoClient(database_url)
-    db = _client[database_name]
+def init_db():
+    """Create the client; call from the app's startup hook so each worker process gets its own pool"""
+    global _client, db
+    if _client is None and database_url and database_name:
+        _client = AsyncIOMotorClient(database_url, maxPoolSize=100)
+        db = _client[database_name]
+    return db
 
-# Helper functions for common database operations
-def create_document(collection_name: str, data: Union[BaseModel, dict]):
-    """Insert a single document with timestamp"""
+async def ensure_indexes():
+    """Create the indexes behind the per-user reminder and vitals queries"""
     if db is None:
-        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+        return
+    try:
+        await db.reminder.create_index([("user_email", 1)])
+        await db.vital.create_index([("user_email", 1), ("recorded_at", -1)])
+    except Exception:
+        logger.exception("Creating indexes failed")
+
+def get_db():
+    """Return the database handle, or None if it is not configured"""
+    return db
+
+def close_db():
+    """Close the client created by init_db"""
+    global _client, db
+    if _client is not None:
+        _client.close()
+    _client = None
+    db = None
 
+# Buffered writes: one queue per collection, drained by a background task via insert_many
+WRITE_BATCH_SIZE = 500
+WRITE_FLUSH_INTERVAL = 0.01  # seconds
+WRITE_QUEUE_MAXSIZE = 10000  # per collection; queue_document waits when full
+WRITE_MAX_ATTEMPTS = 5
+WRITE_RETRY_BACKOFF = 0.5  # seconds, doubled after each failed attempt
+
+_write_queues: Dict[str, asyncio.Queue] = {}
+# Failed batches waiting for another attempt: (docs, attempts so far, monotonic retry time)
+_write_retries: Dict[str, List[Tuple[list, int, float]]] = {}
+_writer_task: Optional[asyncio.Task] = None
+_writer_stopping = False
+
+# Helper functions for common database operations
+def _prepare_document(data: Union[BaseModel, dict]) -> dict:
+    """Convert to a dict and stamp created_at/updated_at"""
     # Convert Pydantic model to dict if needed
     if isinstance(data, BaseModel):
         data_dict = data.model_dump()
     else:
         data_dict = data.copy()
 
-    data_dict['created_at'] = datetime.now(timezone.utc)
-    data_dict['updated_at'] = datetime.now(timezone.utc)
+    now = datetime.now(timezone.utc)
+    data_dict['created_at'] = now
+    data_dict['updated_at'] = now
+    return data_dict
+
+async def create_document(collection_name: str, data: Union[BaseModel, dict]):
+    """Insert a single document with timestamp"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
 
-    result = db[collection_name].insert_one(data_dict)
+    result = await db[collection_name].insert_one(_prepare_document(data))
     return str(result.inserted_id)
 
-def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
+async def queue_document(collection_name: str, data: Union[BaseModel, dict]):
+    """Buffer a document for a batched insert and return its pre-assigned id"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    data_dict = _prepare_document(data)
+    data_dict['_id'] = ObjectId()
+    queue = _write_queues.get(collection_name)
+    if queue is None:
+        queue = _write_queues[collection_name] = asyncio.Queue(maxsize=WRITE_QUEUE_MAXSIZE)
+    await queue.put(data_dict)
+    return str(data_dict['_id'])
+
+async def _insert_batch(collection_name: str, docs: list, attempts: int = 0):
+    """insert_many a batch; keep whatever failed for a retry with backoff, drop it after WRITE_MAX_ATTEMPTS"""
+    try:
+        await db[collection_name].insert_many(docs, ordered=False)
+        return
+    except BulkWriteError as e:
+        # _ids are assigned before queuing, so a duplicate key means an earlier attempt already stored it
+        failed = {err["index"] for err in e.details.get("writeErrors", []) if err.get("code") != 11000}
+        docs = [d for i, d in enumerate(docs) if i in failed]
+        if not docs:
+            return
+        logger.warning("Batched insert into %s failed for %d documents", collection_name, len(docs), exc_info=True)
+    except Exception:
+        logger.warning("Batched insert of %d documents into %s failed", len(docs), collection_name, exc_info=True)
+
+    attempts += 1
+    if attempts >= WRITE_MAX_ATTEMPTS:
+        logger.error("Dropping %d documents for %s after %d failed inserts", len(docs), collection_name, attempts)
+        return
+    retry_at = time.monotonic() + WRITE_RETRY_BACKOFF * 2 ** (attempts - 1)
+    _write_retries.setdefault(collection_name, []).append((docs, attempts, retry_at))
+
+async def flush_writes(force: bool = False):
+    """Insert buffered documents, retrying failed batches first; force ignores retry backoff"""
+    now = time.monotonic()
+    for collection_name in list(_write_retries):
+        pending = _write_retries.pop(collection_name)
+        for docs, attempts, retry_at in pending:
+            if force or retry_at <= now:
+                await _insert_batch(collection_name, docs, attempts)
+            else:
+                _write_retries.setdefault(collection_name, []).append((docs, attempts, retry_at))
+
+    for collection_name, queue in list(_write_queues.items()):
+        # Hold new writes back while this collection has failed batches waiting, so a
+        # full queue pushes back on queue_document instead of piling up retries
+        if _write_retries.get(collection_name) and not force:
+            continue
+        # Only take what is buffered now, so a busy collection cannot starve the others
+        remaining = queue.qsize()
+        while remaining > 0:
+            count = min(remaining, WRITE_BATCH_SIZE)
+            remaining -= count
+            await _insert_batch(collection_name, [queue.get_nowait() for _ in range(count)])
+
+async def _drain_writes():
+    while not _writer_stopping:
+        await asyncio.sleep(WRITE_FLUSH_INTERVAL)
+        await flush_writes()
+
+def start_writer():
+    """Start the background task that drains buffered writes"""
+    global _writer_task, _writer_stopping
+    if db is not None and _writer_task is None:
+        _writer_stopping = False
+        _writer_task = asyncio.create_task(_drain_writes())
+
+async def stop_writer():
+    """Stop the background writer and make a final attempt at whatever is still buffered"""
+    global _writer_task, _writer_stopping
+    if _writer_task is not None:
+        # Let the current flush finish rather than cancelling it mid-insert
+        _writer_stopping = True
+        await _writer_task
+        _writer_task = None
+    if db is not None:
+        await flush_writes(force=True)
+        lost = sum(len(docs) for batches in _write_retries.values() for docs, _, _ in batches)
+        if lost:
+            logger.error("Shutting down with %d unsaved documents", lost)
+
+async def get_documents(collection_name: str, filter_dict: dict = None, limit: int = None):
     """Get documents from collection"""
     if db is None:
         raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
@@ -52,4 +186,4 @@ def get_documents(collection_name: str, filter_dict: dict = None, limit: int = N
     if limit:
         cursor = cursor.limit(limit)
     
-    return list(cursor)
+    return await cursor.to_list(length=limit or None)
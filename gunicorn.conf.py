@@ -0,0 +1,18 @@
+"""
+Gunicorn config: one Uvicorn event loop per worker process.
+
+Run with: gunicorn -c gunicorn.conf.py main:app
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Keep phone clients' connections open across their burst of calls; UvicornWorker
+# reads keepalive and backlog from here, and recycles workers after max_requests.
+keepalive = 75
+backlog = 2048
+max_requests = 50000
+max_requests_jitter = 5000
@@ -1,20 +1,31 @@
 import os
-from datetime import datetime, timedelta
+import asyncio
+import base64
+import functools
+import hashlib
+import hmac
+import threading
+import time
+from datetime import datetime, timezone
 from typing import List, Optional, Dict
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel
+from cachetools import TTLCache
+import ahocorasick
 import jwt
+import orjson
 
-from database import create_document, get_documents, db
+from database import init_db, close_db, ensure_indexes, get_db, create_document, queue_document, get_documents, start_writer, stop_writer
 from schemas import User, Reminder, Vital, Doctor, Consultation, Message, Prescription, OfflineMessage
 
 JWT_SECRET = os.getenv("JWT_SECRET", "dev_secret_change_me")
 JWT_ALGO = "HS256"
+JWT_TTL_SECONDS = 7 * 24 * 3600
 
-app = FastAPI(title="MedLink AI App API")
+app = FastAPI(title="MedLink AI App API", default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,8 +36,25 @@ app.add_middleware(
 )
 
 
+@app.on_event("startup")
+async def startup():
+    init_db()
+    # In the background, so an unreachable Mongo cannot hold up worker boot past gunicorn's timeout
+    app.state.index_task = asyncio.create_task(ensure_indexes())
+    start_writer()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.index_task.cancel()
+    await stop_writer()
+    close_db()
+
+
 # ---------------------- Auth Helpers ----------------------
-http_bearer = HTTPBearer(auto_error=False)
+# Verified token claims keyed by SHA-256 of the raw token. Failed verifications are never cached.
+_jwt_cache: TTLCache = TTLCache(maxsize=10000, ttl=60)
+_jwt_cache_lock = threading.Lock()
 
 class TokenResponse(BaseModel):
     access_token: str
@@ -35,35 +63,137 @@ class TokenResponse(BaseModel):
     email: Optional[str] = None
 
 
+# HS256 signing is done by hand: the header segment and key bytes never change.
+# Verification still goes through jwt.decode.
+_JWT_KEY = JWT_SECRET.encode()
+
+
+def _b64url(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+_JWT_HEADER_B64 = _b64url(b'{"alg":"HS256","typ":"JWT"}')
+
+
 def create_token(email: str, name: str = "User") -> str:
+    now = int(time.time())
     payload = {
         "sub": email,
         "name": name,
-        "exp": datetime.utcnow() + timedelta(days=7),
-        "iat": datetime.utcnow(),
+        "exp": now + JWT_TTL_SECONDS,
+        "iat": now,
     }
-    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGO)
-
-
-def get_current_user(creds: Optional[HTTPAuthorizationCredentials] = Depends(http_bearer)) -> Optional[dict]:
-    if not creds:
-        return None
-    token = creds.credentials
+    signing_input = _JWT_HEADER_B64 + b"." + _b64url(orjson.dumps(payload))
+    signature = hmac.new(_JWT_KEY, signing_input, hashlib.sha256).digest()
+    return (signing_input + b"." + _b64url(signature)).decode("ascii")
+
+
+# All guests share one identity, so one token is reused until it is within a day of expiry.
+GUEST_EMAIL = "guest@medlink.ai"
+GUEST_TOKEN_REFRESH_SECONDS = 24 * 3600
+_guest_token: Optional[str] = None
+_guest_token_exp = 0
+
+
+def get_guest_token() -> str:
+    global _guest_token, _guest_token_exp
+    now = int(time.time())
+    if _guest_token is None or _guest_token_exp - now < GUEST_TOKEN_REFRESH_SECONDS:
+        _guest_token = create_token(GUEST_EMAIL, "Guest")
+        _guest_token_exp = now + JWT_TTL_SECONDS
+    return _guest_token
+
+
+def verify_token(token: str) -> Optional[dict]:
+    """Return the token's user, or None if it is invalid or expired."""
+    key = hashlib.sha256(token.encode()).digest()
+    with _jwt_cache_lock:
+        cached = _jwt_cache.get(key)
+    if cached is not None and cached["exp"] > time.time():
+        return {"email": cached["email"], "name": cached["name"]}
     try:
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGO])
-        return {"email": payload.get("sub"), "name": payload.get("name")}
     except Exception:
+        return None
+    user = {"email": payload.get("sub"), "name": payload.get("name")}
+    # jwt.decode accepts tokens without exp; those are verified every time rather than cached
+    if payload.get("exp") is not None:
+        with _jwt_cache_lock:
+            _jwt_cache[key] = {**user, "exp": payload["exp"]}
+    return user
+
+
+class JWTAuthMiddleware:
+    """Verify the bearer token once per request and stash the result in scope["state"].
+
+    state["user"] is the verified user or None; state["auth_error"] is set when a
+    bearer token was sent but failed verification. Only current_user() turns that into a 401.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            state = scope.setdefault("state", {})
+            state["user"] = None
+            state["auth_error"] = False
+            for name, value in scope["headers"]:
+                if name == b"authorization":
+                    scheme, _, token = value.decode("latin-1").partition(" ")
+                    if scheme.lower() == "bearer" and token:
+                        state["user"] = verify_token(token)
+                        state["auth_error"] = state["user"] is None
+                    break
+        await self.app(scope, receive, send)
+
+
+app.add_middleware(JWTAuthMiddleware)
+
+
+def current_user(request: Request) -> Optional[dict]:
+    if request.state.auth_error:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return request.state.user
+
+
+# Auth runs in the middleware, so the bearer scheme is published in OpenAPI by hand;
+# routes opt in with openapi_extra=BEARER_AUTH.
+BEARER_AUTH = {"security": [{"HTTPBearer": []}]}
+_default_openapi = app.openapi
+
+
+def _openapi_with_bearer() -> dict:
+    if app.openapi_schema is None:
+        schema = _default_openapi()
+        schemes = schema.setdefault("components", {}).setdefault("securitySchemes", {})
+        schemes["HTTPBearer"] = {"type": "http", "scheme": "bearer"}
+    return app.openapi_schema
+
+
+app.openapi = _openapi_with_bearer
 
 
 # ---------------------- Basic & Health ----------------------
 @app.get("/")
-def root():
+async def root():
     return {"app": "MedLink AI", "status": "ok"}
 
 
+# Health probes hit /test every few seconds; only ask Mongo for its collections every 30s.
+# Errors are not cached.
+_collections_cache: TTLCache = TTLCache(maxsize=1, ttl=30)
+
+
+async def _list_collections(db) -> List[str]:
+    names = _collections_cache.get("collections")
+    if names is None:
+        names = _collections_cache["collections"] = (await db.list_collection_names())[:10]
+    return names
+
+
 @app.get("/test")
-def test_database():
+async def test_database():
     response = {
         "backend": "✅ Running",
         "database": "❌ Not Available",
@@ -73,13 +203,14 @@ def test_database():
         "collections": []
     }
     try:
+        db = get_db()
         if db is not None:
             response["database"] = "✅ Available"
             response["database_url"] = "✅ Set" if os.getenv("DATABASE_URL") else "❌ Not Set"
             response["database_name"] = db.name if hasattr(db, 'name') else "✅ Set"
             response["connection_status"] = "Connected"
             try:
-                response["collections"] = db.list_collection_names()[:10]
+                response["collections"] = await _list_collections(db)
                 response["database"] = "✅ Connected & Working"
             except Exception as e:
                 response["database"] = f"⚠️ Connected but Error: {str(e)[:80]}"
@@ -95,18 +226,16 @@ class LoginRequest(BaseModel):
     password: Optional[str] = None  # demo only
 
 
-@app.post("/auth/login", response_model=TokenResponse)
-def login(req: LoginRequest):
+@app.post("/auth/login", responses={200: {"model": TokenResponse}})
+async def login(req: LoginRequest):
     # Demo: accept any email/password and return token
     token = create_token(req.email, req.name or "User")
     return TokenResponse(access_token=token, name=req.name, email=req.email)
 
 
-@app.post("/auth/guest", response_model=TokenResponse)
-def guest_login():
-    email = "guest@medlink.ai"
-    token = create_token(email, "Guest")
-    return TokenResponse(access_token=token, name="Guest", email=email)
+@app.post("/auth/guest", responses={200: {"model": TokenResponse}})
+async def guest_login():
+    return TokenResponse(access_token=get_guest_token(), name="Guest", email=GUEST_EMAIL)
 
 
 # ---------------------- Symptom Checker ----------------------
@@ -122,28 +251,54 @@ KEYWORDS: Dict[str, List[str]] = {
     "Migraine": ["headache", "throbbing", "sensitivity to light"],
 }
 
+_DIAGNOSES = tuple(KEYWORDS)
+FALLBACK_CAUSES = ("General Viral Infection", "Dehydration")
+
+
+def _build_keyword_automaton() -> ahocorasick.Automaton:
+    """Compile all keywords into one trie with failure links; terminals carry the diagnosis bit."""
+    automaton = ahocorasick.Automaton()
+    for diagnosis_id, diagnosis in enumerate(_DIAGNOSES):
+        for key in KEYWORDS[diagnosis]:
+            automaton.add_word(key, 1 << diagnosis_id)
+    automaton.make_automaton()
+    return automaton
+
+
+@functools.lru_cache(maxsize=1024)
+def _causes_for_mask(mask: int) -> tuple:
+    """Top-3 diagnoses (in KEYWORDS order) for a bitmask of matches, or the fallback causes."""
+    causes = tuple(d for i, d in enumerate(_DIAGNOSES) if mask >> i & 1)
+    return causes[:3] or FALLBACK_CAUSES
+
+
+# Built once per worker; a request is one linear scan of its text.
+_keyword_automaton = _build_keyword_automaton()
+
 
 @app.post("/ai/analyze")
-def analyze_symptoms(req: SymptomRequest):
+async def analyze_symptoms(req: SymptomRequest):
     text = req.text.lower()
-    matches = []
-    for diagnosis, keys in KEYWORDS.items():
-        if any(k in text for k in keys):
-            matches.append(diagnosis)
-    if not matches:
-        matches = ["General Viral Infection", "Dehydration"]
-    return {"possible_causes": matches[:3]}
+    mask = 0
+    for _, bit in _keyword_automaton.iter(text):
+        mask |= bit
+    return {"possible_causes": _causes_for_mask(mask)}
 
 
 # ---------------------- Doctors & Consultation ----------------------
-@app.get("/doctors", response_model=List[Doctor])
-def list_doctors():
-    seed = [
-        {"name": "Dr. Neha Kapoor", "specialty": "General Physician", "status": "Available", "rating": 4.9},
-        {"name": "Dr. Arjun Mehta", "specialty": "Cardiologist", "status": "Busy", "rating": 4.7},
-        {"name": "Dr. Ishita Rao", "specialty": "Pediatrician", "status": "Available", "rating": 4.8},
-    ]
-    return seed
+DOCTORS_SEED: List[Doctor] = [
+    Doctor(name="Dr. Neha Kapoor", specialty="General Physician", status="Available", rating=4.9),
+    Doctor(name="Dr. Arjun Mehta", specialty="Cardiologist", status="Busy", rating=4.7),
+    Doctor(name="Dr. Ishita Rao", specialty="Pediatrician", status="Available", rating=4.8),
+]
+
+# Static response, validated and serialized once at import.
+_DOCTORS_JSON = orjson.dumps([d.model_dump() for d in DOCTORS_SEED])
+
+
+@app.get("/doctors", responses={200: {"model": List[Doctor]}})
+async def list_doctors():
+    return Response(content=_DOCTORS_JSON, media_type="application/json")
 
 
 class StartCallRequest(BaseModel):
@@ -152,13 +307,14 @@ class StartCallRequest(BaseModel):
 
 
 @app.post("/consult/start")
-def start_consult(req: StartCallRequest):
-    cons = Consultation(
+async def start_consult(req: StartCallRequest):
+    # Fields come from the already-validated request body, so skip re-validation
+    cons = Consultation.model_construct(
         user_email=req.user_email,
         doctor_name=req.doctor_name,
-        started_at=datetime.utcnow(),
+        started_at=datetime.now(timezone.utc),
     )
-    cons_id = create_document("consultation", cons)
+    cons_id = await create_document("consultation", cons)
     return {"consultation_id": cons_id, "status": "started"}
 
 
@@ -169,14 +325,15 @@ class ChatMessage(BaseModel):
 
 
 @app.post("/consult/message")
-def post_message(msg: ChatMessage):
-    message = Message(
+async def post_message(msg: ChatMessage):
+    # Fields come from the already-validated request body, so skip re-validation
+    message = Message.model_construct(
         consultation_id=msg.consultation_id,
         sender="user" if msg.sender not in ["user", "doctor"] else msg.sender,
         text=msg.text,
-        sent_at=datetime.utcnow(),
+        sent_at=datetime.now(timezone.utc),
     )
-    _id = create_document("message", message)
+    _id = await queue_document("message", message)
     return {"message_id": _id}
 
 
@@ -186,62 +343,70 @@ class EndCallRequest(BaseModel):
 
 
 @app.post("/consult/end")
-def end_consult(req: EndCallRequest):
+async def end_consult(req: EndCallRequest):
     # For demo, just echo. In real app, update consultation with rating/end time
     return {"consultation_id": req.consultation_id, "status": "ended", "rating": req.rating}
 
 
 # ---------------------- Prescriptions ----------------------
-@app.get("/prescriptions/sample", response_model=Prescription)
-def get_sample_prescription():
-    return Prescription(
-        user_email="sandhya@example.com",
-        doctor_name="Dr. Neha Kapoor",
-        date=datetime.utcnow(),
-        diagnosis="Viral Fever",
-        medicines=[
-            {"name": "Paracetamol 500mg", "dosage": "1 tablet", "timing": "Every 6 hours"},
-            {"name": "ORS", "dosage": "200ml", "timing": "After each loose stool"},
-        ],
-        notes="Hydrate well and rest for 2-3 days."
-    )
+# Serialized bodies of the mock endpoints (sample prescription, profiles by email)
+_response_cache: TTLCache = TTLCache(maxsize=1024, ttl=3600)
+
+
+@app.get("/prescriptions/sample", responses={200: {"model": Prescription}})
+async def get_sample_prescription():
+    body = _response_cache.get("prescription")
+    if body is None:
+        body = _response_cache["prescription"] = Prescription(
+            user_email="sandhya@example.com",
+            doctor_name="Dr. Neha Kapoor",
+            date=datetime.now(timezone.utc),
+            diagnosis="Viral Fever",
+            medicines=[
+                {"name": "Paracetamol 500mg", "dosage": "1 tablet", "timing": "Every 6 hours"},
+                {"name": "ORS", "dosage": "200ml", "timing": "After each loose stool"},
+            ],
+            notes="Hydrate well and rest for 2-3 days."
+        ).model_dump_json().encode()
+    return Response(content=body, media_type="application/json")
 
 
 # ---------------------- Reminders ----------------------
-@app.post("/reminders")
-def create_reminder(rem: Reminder, user: Optional[dict] = Depends(get_current_user)):
-    _ = create_document("reminder", rem)
+def _documents_response(docs: List[dict]) -> Response:
+    # Serialize in one pass; orjson stringifies ObjectId via default=str instead of a copy loop
+    return Response(content=orjson.dumps(docs, default=str), media_type="application/json")
+
+
+@app.post("/reminders", openapi_extra=BEARER_AUTH)
+async def create_reminder(rem: Reminder, request: Request):
+    current_user(request)
+    _ = await queue_document("reminder", rem)
     return {"status": "created"}
 
 
 @app.get("/reminders")
-def list_reminders(email: Optional[str] = None):
-    docs = get_documents("reminder", {"user_email": email} if email else {}, limit=100)
-    # convert ObjectId to str
-    for d in docs:
-        d["_id"] = str(d["_id"]) if "_id" in d else None
-    return docs
+async def list_reminders(email: Optional[str] = None):
+    docs = await get_documents("reminder", {"user_email": email} if email else {}, limit=100)
+    return _documents_response(docs)
 
 
 # ---------------------- Vitals ----------------------
 @app.post("/vitals")
-def record_vital(v: Vital):
-    _ = create_document("vital", v)
+async def record_vital(v: Vital):
+    _ = await queue_document("vital", v)
     return {"status": "recorded"}
 
 
 @app.get("/vitals")
-def get_vitals(email: Optional[str] = None, limit: int = 20):
-    docs = get_documents("vital", {"user_email": email} if email else {}, limit=limit)
-    for d in docs:
-        d["_id"] = str(d["_id"]) if "_id" in d else None
-    return docs
+async def get_vitals(email: Optional[str] = None, limit: int = Query(20, ge=1)):
+    docs = await get_documents("vital", {"user_email": email} if email else {}, limit=limit)
+    return _documents_response(docs)
 
 
 # ---------------------- Offline / SMS Mode ----------------------
 @app.post("/offline")
-def save_offline(msg: OfflineMessage):
-    _ = create_document("offlinemessage", msg)
+async def save_offline(msg: OfflineMessage):
+    _ = await queue_document("offlinemessage", msg)
     return {"status": "queued", "info": "A doctor will reply via SMS soon."}
 
 
@@ -255,26 +420,39 @@ class ProfileUpdate(BaseModel):
 
 
 @app.get("/profile")
-def get_profile(email: str = "sandhya@example.com"):
+async def get_profile(email: str = "sandhya@example.com"):
     # For prototype, return a mock profile
-    return {
-        "name": "Sandhya",
-        "email": email,
-        "age": 28,
-        "gender": "Female",
-        "language": "English",
-        "dark_mode": False,
-        "medical_history": ["Consultation - 2024-05-10", "Typhoid (2019)"]
-    }
+    key = ("profile", email)
+    body = _response_cache.get(key)
+    if body is None:
+        body = _response_cache[key] = orjson.dumps({
+            "name": "Sandhya",
+            "email": email,
+            "age": 28,
+            "gender": "Female",
+            "language": "English",
+            "dark_mode": False,
+            "medical_history": ["Consultation - 2024-05-10", "Typhoid (2019)"]
+        })
+    return Response(content=body, media_type="application/json")
 
 
 @app.post("/profile")
-def update_profile(update: ProfileUpdate):
+async def update_profile(update: ProfileUpdate):
     # For prototype, just echo back
     return {"status": "updated", "profile": update.model_dump(exclude_none=True)}
 
 
 if __name__ == "__main__":
     import uvicorn
+    # Single-process dev server; deploy with `gunicorn -c gunicorn.conf.py main:app` to use every core
     port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    uvicorn.run(
+        app,
+        host="0.0.0.0",
+        port=port,
+        loop="uvloop",
+        http="httptools",
+        timeout_keep_alive=75,
+        backlog=2048,
+    )